@@ -292,6 +292,8 @@ class DistributedJobMaster(JobMaster):
                 self.job_manager.stop()
             if self.diagnosis_manager:
                 self.diagnosis_manager.stop_observing()
+            if self.task_manager:
+                self.task_manager.stop()
             self.stop()
 
         return self._exit_code
@@ -12,6 +12,7 @@
 # limitations under the License.
 
 import json
+import threading
 from abc import ABCMeta, abstractmethod
 from typing import Dict, List
 
@@ -95,6 +96,7 @@ class DatasetManger(metaclass=ABCMeta):
     Attributes:
         todo: A list to store tasks.
         doing: Dict[int, DoingTask] where key is the task id.
+        lock: A lock to protect the todo and doing tasks of the dataset.
     """
 
     def __init__(
@@ -102,6 +104,7 @@ class DatasetManger(metaclass=ABCMeta):
     ):
         self.todo: List[Task] = []
         self.doing: Dict[int, DoingTask] = {}
+        self.lock = threading.Lock()
 
         self._task_type = task_type
         self._batch_size = batch_size
@@ -34,6 +34,9 @@ class BatchDatasetManager(DatasetManger):
         batch_size: the size of a batch.
         dataset_splitter: DatasetSplitter instace to split the dataset
             into shards.
+        current_epoch: the epoch of the dataset which is updated when
+            creating shards or restoring from a checkpoint. Reading it
+            does not need the lock of the dataset.
     """
 
     def __init__(
@@ -48,6 +51,7 @@ class BatchDatasetManager(DatasetManger):
         self._max_task_completed_time = 0
         self._task_id = 0
         self._completed_step = 0
+        self.current_epoch = dataset_splitter.get_epoch()
 
     def get_task(self, node_type, node_id) -> Task:
         """Return next Task"""
@@ -59,6 +63,7 @@ class BatchDatasetManager(DatasetManger):
             # `dataset.repeat()`.
             shards = self._dataset_splitter.create_shards()
             self._create_todo_tasks(shards)
+            self.current_epoch = self._dataset_splitter.get_epoch()
         if not self.todo:
             # No more tasks
             return Task.create_invalid_task()
@@ -76,7 +81,7 @@ class BatchDatasetManager(DatasetManger):
         return task
 
     def get_epoch(self):
-        return self._dataset_splitter.get_epoch()
+        return self.current_epoch
 
     def completed(self):
         return (
@@ -180,6 +185,7 @@ class BatchDatasetManager(DatasetManger):
     def restore_checkpoint(self, checkpoint: DatasetShardCheckpoint):
         """Restore the task manager from a checkpoint"""
         self._dataset_splitter.epoch = checkpoint.epoch
+        self.current_epoch = self._dataset_splitter.get_epoch()
         self.todo = []
         self.doing = {}
         for shard_indices in checkpoint.doing + checkpoint.todo:
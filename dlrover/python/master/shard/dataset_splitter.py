@@ -12,7 +12,6 @@
 # limitations under the License.
 
 import copy
-import inspect
 import math
 import random
 from abc import ABCMeta, abstractmethod
@@ -330,11 +329,16 @@ def new_dataset_splitter(
     dataset_name,
     storage_type=None,
 ):
-    frame = inspect.currentframe()
-    args, _, _, values = inspect.getargvalues(frame)
     logger.info(
         "New a datast splitter with: %s",
-        [(i, values[i]) for i in args],
+        [
+            ("shuffle", shuffle),
+            ("shard_size", shard_size),
+            ("dataset_size", dataset_size),
+            ("num_epochs", num_epochs),
+            ("dataset_name", dataset_name),
+            ("storage_type", storage_type),
+        ],
     )
     if not storage_type or storage_type == TableDatasetSplitter.STORAGE_TYPE:
         return TableDatasetSplitter(
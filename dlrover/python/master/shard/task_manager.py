@@ -11,11 +11,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import heapq
 import threading
 import time
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from collections.abc import Callable
-from typing import Dict, List
+from typing import Dict, List, Set, Tuple
 
 from dlrover.proto import elastic_training_pb2
 from dlrover.python.common import grpc
@@ -25,6 +26,7 @@ from dlrover.python.master.monitor.speed_monitor import SpeedMonitor
 from dlrover.python.master.shard.base_dataset_manager import (
     DatasetManger,
     DatasetShardCheckpoint,
+    DoingTask,
 )
 from dlrover.python.master.shard.batch_dataset_manager import (
     BatchDatasetManager,
@@ -32,6 +34,13 @@ from dlrover.python.master.shard.batch_dataset_manager import (
 from dlrover.python.master.shard.dataset_splitter import DatasetSplitter
 
 _TASK_TIMEOUT_THRESHOLD_SECS = 1800
+_STOP_MONITOR_TIMEOUT_SECS = 10
+
+# Bind the task types once to avoid attribute lookups on the protobuf
+# module when dispatching tasks.
+_NONE = elastic_training_pb2.NONE
+_TRAINING = elastic_training_pb2.TRAINING
+_EVALUATION = elastic_training_pb2.EVALUATION
 
 
 class TaskManager(object):
@@ -46,13 +55,35 @@ class TaskManager(object):
                 when it does not report a task status for a long time.
             speed_monitor: monitor the training speed with workers.
         """
-        self._lock = threading.Lock()
+        # The lock only protects the insertion and lookup of datasets
+        # and the index of doing tasks of nodes. Each dataset has its own
+        # lock to protect its tasks. The index is updated with the lock
+        # of the dataset held, so the lock is always acquired after it.
+        self._datasets_lock = threading.Lock()
         self._worker_restart_timeout = worker_restart_timeout
         self._should_stop = False
+        self._timeout_monitor_thread = None
         self._datasets: Dict[str, DatasetManger] = OrderedDict()
+        # The monotonic time when the node fetches or reports a task.
         self._worker_start_task_time: Dict[int, float] = {}
+        # The doing tasks of each node. The key is (node_type, node_id)
+        # and the value is a set of (dataset_name, task_id).
+        self._worker_tasks: Dict[
+            Tuple[str, int], Set[Tuple[str, int]]
+        ] = defaultdict(set)
         self._task_timeout_callbacks: List[Callable] = []
+        # A min-heap of (deadline, node_id, dataset_name, task_id) of
+        # the dispatched evaluation tasks which may be timeout. The
+        # deadline is a monotonic time.
+        self._task_deadlines: List[Tuple[float, int, str, int]] = []
+        self._task_deadlines_cond = threading.Condition()
+        self._task_timeout = max(
+            _TASK_TIMEOUT_THRESHOLD_SECS, self._worker_restart_timeout
+        )
         self._speed_monitor = speed_monitor
+        # The lock protects the state of the parallel evaluation which
+        # is updated by dispatching tasks of different datasets.
+        self._paral_eval_lock = threading.Lock()
         self._paral_eval_count = 0
         self._paral_eval_started = False
 
@@ -62,14 +93,14 @@ class TaskManager(object):
         dataset_size,
         dataset_name,
         dataset_splitter: DatasetSplitter,
-        task_type=elastic_training_pb2.NONE,
+        task_type=_NONE,
     ):
         logger.info(
             f"New {task_type} dataset {dataset_name} with, "
             f"batch size = {batch_size} dataset size = {dataset_size}"
         )
 
-        with self._lock:
+        with self._datasets_lock:
             if dataset_name in self._datasets:
                 logger.info(
                     "The shards for dataset %s have already been initialized. "
@@ -93,54 +124,71 @@ class TaskManager(object):
 
     def get_dataset_task(self, node_type, node_id, dataset_name):
         """Return next Task"""
-        with self._lock:
+        with self._datasets_lock:
             dataset = self._datasets.get(dataset_name, None)
-            if dataset:
-                task = dataset.get_task(node_type, node_id)
-                if (
-                    task.task_type == elastic_training_pb2.EVALUATION
-                    and node_type == NodeType.WORKER
-                ):
-                    # All workers will stop training to evaluate the model
-                    # at parallel validation
-                    logger.info(
-                        "Reset speed monitor if the worker starts evaluation"
+        if not dataset:
+            return None
+        with dataset.lock:
+            task = dataset.get_task(node_type, node_id)
+            if task.task_id >= 0:
+                with self._datasets_lock:
+                    self._worker_tasks[(node_type, node_id)].add(
+                        (dataset_name, task.task_id)
                     )
-                    self._speed_monitor.reset_running_speed_monitor()
-                    self._speed_monitor.set_worker_start_eval_time(node_id)
-                    if not self._paral_eval_started:
-                        self._paral_eval_count += 1
-                        self._paral_eval_started = True
-                if task.task_type == elastic_training_pb2.TRAINING:
-                    self._speed_monitor.add_running_worker(node_type, node_id)
-                    self._speed_monitor.update_worker_eval_time(node_id)
-                    self._paral_eval_started = False
-                self._worker_start_task_time[node_id] = time.time()
-                return task
-            else:
-                return None
+        if task.task_id >= 0:
+            if (
+                task.task_type == _EVALUATION
+                and self._worker_restart_timeout > 0
+            ):
+                self._add_task_deadline(
+                    time.monotonic() + self._task_timeout,
+                    node_id,
+                    dataset_name,
+                    task.task_id,
+                )
+        if task.task_type == _EVALUATION and node_type == NodeType.WORKER:
+            # All workers will stop training to evaluate the model
+            # at parallel validation
+            logger.info("Reset speed monitor if the worker starts evaluation")
+            self._speed_monitor.reset_running_speed_monitor()
+            self._speed_monitor.set_worker_start_eval_time(node_id)
+            with self._paral_eval_lock:
+                if not self._paral_eval_started:
+                    self._paral_eval_count += 1
+                    self._paral_eval_started = True
+        if task.task_type == _TRAINING:
+            self._speed_monitor.add_running_worker(node_type, node_id)
+            self._speed_monitor.update_worker_eval_time(node_id)
+            with self._paral_eval_lock:
+                self._paral_eval_started = False
+        self._worker_start_task_time[node_id] = time.monotonic()
+        return task
 
     def get_dataset(self, dataset_name):
         return self._datasets.get(dataset_name, None)
 
     def report_dataset_task(self, request: grpc.TaskResult, success: bool):
         """Report if the task is successful or not"""
+        return self._report_dataset_task_impl(
+            request.task_id, request.dataset_name, success
+        )
 
-        task_id = request.task_id
-        dataset_name = request.dataset_name
-        with self._lock:
+    def _report_dataset_task_impl(self, task_id, dataset_name, success):
+        with self._datasets_lock:
             dataset = self._datasets.get(dataset_name, None)
-            if not dataset:
-                raise ValueError(
-                    "There is no dataset shard for the dataset {}".format(
-                        dataset_name
-                    )
+        if not dataset:
+            raise ValueError(
+                "There is no dataset shard for the dataset {}".format(
+                    dataset_name
                 )
+            )
+        with dataset.lock:
             success, doing_task = dataset.report_task_status(task_id, success)
-            if success:
-                self._worker_start_task_time[doing_task.node_id] = time.time()
-                return doing_task.task, doing_task.node_id
-            return None, None
+            self._remove_worker_task(dataset_name, doing_task)
+        if success:
+            self._worker_start_task_time[doing_task.node_id] = time.monotonic()
+            return doing_task.task, doing_task.node_id
+        return None, None
 
     def task_hanged(self):
         dataset_hang = []
@@ -163,30 +211,54 @@ class TaskManager(object):
         # Place the values into a list to avoid the error
         # OrderedDict mutated during iteration.
         datasets = list(self._datasets.values())
-        finished = all([ds.completed() for ds in datasets])
-        return finished
+        return all(ds.completed() for ds in datasets)
+
+    def _remove_worker_task(self, dataset_name, doing_task: DoingTask):
+        """Remove the reported task from the doing tasks of its node.
+        The caller must hold the lock of the dataset."""
+        if not doing_task:
+            return
+        with self._datasets_lock:
+            node_tasks = self._worker_tasks.get(
+                (doing_task.node_type, doing_task.node_id), None
+            )
+            if node_tasks:
+                node_tasks.discard((dataset_name, doing_task.task.task_id))
+
+    def _remove_dataset_worker_tasks(self, dataset_name):
+        """Remove all tasks of the dataset from the doing tasks of nodes.
+        The caller must hold the lock of the dataset."""
+        with self._datasets_lock:
+            for node_tasks in self._worker_tasks.values():
+                stale_tasks = [t for t in node_tasks if t[0] == dataset_name]
+                node_tasks.difference_update(stale_tasks)
 
     def recover_tasks(self, node_type, node_id):
         """Recover doing tasks for a dead worker if needed"""
-        for name, dataset in self._datasets.items():
-            doing_tasks = dataset.doing
-            if not doing_tasks:
-                continue
-            ids = [
-                task_id
-                for task_id, doing_task in doing_tasks.items()
-                if doing_task.node_id == node_id
-                and doing_task.node_type == node_type
-            ]
-            if not ids:
+        with self._datasets_lock:
+            node_tasks = self._worker_tasks.pop((node_type, node_id), set())
+        dataset_task_ids: Dict[str, List[int]] = defaultdict(list)
+        for name, task_id in node_tasks:
+            dataset_task_ids[name].append(task_id)
+
+        for name, ids in dataset_task_ids.items():
+            dataset = self.get_dataset(name)
+            if not dataset:
                 continue
-            request = grpc.TaskResult()
             recover_tasks = []
-            for id in ids:
-                request.task_id = id
-                request.dataset_name = name
-                recover_tasks.append(id)
-                self.report_dataset_task(request, False)
+            with dataset.lock:
+                for task_id in sorted(ids):
+                    doing_task = dataset.doing.get(task_id, None)
+                    if (
+                        not doing_task
+                        or doing_task.node_id != node_id
+                        or doing_task.node_type != node_type
+                    ):
+                        continue
+                    dataset.report_task_status(task_id, False)
+                    recover_tasks.append(task_id)
+            if not recover_tasks:
+                continue
             logger.info(
                 "Recover tasks %s of dataset %s assigned to %s-%d",
                 recover_tasks,
@@ -197,14 +269,34 @@ class TaskManager(object):
 
     def start(self):
         if self._worker_restart_timeout > 0:
-            threading.Thread(
+            self._timeout_monitor_thread = threading.Thread(
                 target=self._check_and_reassign_timeout_tasks,
                 name="check_timeout_tasks",
                 daemon=True,
-            ).start()
+            )
+            self._timeout_monitor_thread.start()
+
+    def stop(self):
+        """Stop the thread to monitor timeout tasks."""
+        with self._task_deadlines_cond:
+            self._should_stop = True
+            self._task_deadlines_cond.notify_all()
+        if self._timeout_monitor_thread:
+            # The thread may be blocked by a timeout callback which scales
+            # nodes, so wait for a bounded time. The thread is a daemon
+            # and does not block the process from exiting.
+            self._timeout_monitor_thread.join(
+                timeout=_STOP_MONITOR_TIMEOUT_SECS
+            )
+            if self._timeout_monitor_thread.is_alive():
+                logger.warning(
+                    "The thread to monitor timeout tasks does not stop "
+                    f"in {_STOP_MONITOR_TIMEOUT_SECS}s."
+                )
+            self._timeout_monitor_thread = None
 
     def reset_worker_start_task_time(self, worker_id):
-        self._worker_start_task_time[worker_id] = time.time()
+        self._worker_start_task_time[worker_id] = time.monotonic()
 
     def set_task_timeout_callback(self, callback_fn):
         self._task_timeout_callbacks.append(callback_fn)
@@ -213,36 +305,74 @@ class TaskManager(object):
         for callback_fn in self._task_timeout_callbacks:
             callback_fn(worker_id)
 
+    def _add_task_deadline(self, deadline, node_id, dataset_name, task_id):
+        with self._task_deadlines_cond:
+            heapq.heappush(
+                self._task_deadlines,
+                (deadline, node_id, dataset_name, task_id),
+            )
+            if self._task_deadlines[0][0] == deadline:
+                # Wake up the monitor thread to wait the earliest deadline.
+                self._task_deadlines_cond.notify()
+
+    def _wait_timeout_tasks(self):
+        """Wait until the deadline of some tasks comes and
+        return those tasks. Return an empty list if the manager stops."""
+        with self._task_deadlines_cond:
+            while True:
+                if self._should_stop:
+                    return []
+                now = time.monotonic()
+                if self._task_deadlines and self._task_deadlines[0][0] <= now:
+                    break
+                wait_secs = (
+                    self._task_deadlines[0][0] - now
+                    if self._task_deadlines
+                    else None
+                )
+                self._task_deadlines_cond.wait(timeout=wait_secs)
+            timeout_tasks = []
+            while self._task_deadlines and self._task_deadlines[0][0] <= now:
+                _, node_id, dataset_name, task_id = heapq.heappop(
+                    self._task_deadlines
+                )
+                timeout_tasks.append((node_id, dataset_name, task_id))
+            return timeout_tasks
+
+    def _reassign_timeout_task(self, node_id, dataset_name, task_id):
+        """Reassign the task if the node does not report any task
+        before the deadline."""
+        dataset = self.get_dataset(dataset_name)
+        if not dataset:
+            return
+        with dataset.lock:
+            doing_task = dataset.doing.get(task_id, None)
+            if not doing_task or doing_task.node_id != node_id:
+                # The task has been completed or reassigned.
+                return
+            cur = time.monotonic()
+            start = self._worker_start_task_time.get(node_id, cur)
+            deadline = start + self._task_timeout
+            if deadline <= cur:
+                dataset.report_task_status(task_id, success=False)
+                self._remove_worker_task(dataset_name, doing_task)
+        if deadline > cur:
+            # The node has reported other tasks after fetching the task.
+            self._add_task_deadline(deadline, node_id, dataset_name, task_id)
+            return
+        logger.info(
+            f"The task {task_id} of {doing_task.node_type}-"
+            f"{doing_task.node_id} is timeout."
+        )
+        self._invoke_task_timeout_callback(node_id)
+
     def _check_and_reassign_timeout_tasks(self):
-        """Check whether there are timeout tasks periodically."""
+        """Check whether there are timeout tasks when their deadlines come."""
         logger.info("Start the thread to monitor timeout tasks.")
-        while True:
-            for _, dataset in self._datasets.items():
-                # Copy doing task list because the doing list will pop items
-                # in the following loop.
-                doing_tasks = dataset.doing.copy()
-                cur = time.time()
-                for task_id, doing_task in doing_tasks.items():
-                    start = self._worker_start_task_time.get(
-                        doing_task.node_id, cur
-                    )
-                    if (
-                        doing_task.task.task_type
-                        == elastic_training_pb2.EVALUATION
-                        and cur - start
-                        > max(
-                            _TASK_TIMEOUT_THRESHOLD_SECS,
-                            self._worker_restart_timeout,
-                        )
-                    ):
-                        logger.info(
-                            f"The task {task_id} of {doing_task.node_type}-"
-                            f"{doing_task.node_id} is timeout."
-                        )
-                        dataset.report_task_status(task_id, success=False)
-                        self._invoke_task_timeout_callback(doing_task.node_id)
-                        break
-            time.sleep(30)
+        while not self._should_stop:
+            for node_id, dataset_name, task_id in self._wait_timeout_tasks():
+                self._reassign_timeout_task(node_id, dataset_name, task_id)
+        logger.info("Stop the thread to monitor timeout tasks.")
 
     def get_dataset_checkpoint(self, dataset_name):
         """Get the data shard checkpoint by dataset name.
@@ -253,12 +383,12 @@ class TaskManager(object):
         Returns:
             DatasetShardCheckpoint.
         """
-        with self._lock:
-            if dataset_name in self._datasets:
-                dataset = self._datasets[dataset_name]
-                return dataset.checkpoint()
-            else:
-                return None
+        with self._datasets_lock:
+            dataset = self._datasets.get(dataset_name, None)
+        if not dataset:
+            return None
+        with dataset.lock:
+            return dataset.checkpoint()
 
     def restore_dataset_from_checkpoint(self, checkpoint):
         try:
@@ -267,7 +397,12 @@ class TaskManager(object):
             if not dataset:
                 logger.error("No dataset for checkpoint %s", checkpoint)
 
-            dataset.restore_checkpoint(dataset_checkpoint)
+            with dataset.lock:
+                dataset.restore_checkpoint(dataset_checkpoint)
+                # The doing tasks of the dataset are reset.
+                self._remove_dataset_worker_tasks(
+                    dataset_checkpoint.dataset_name
+                )
             logger.info(
                 "Restore %s dataset with %s shards from checkpoint",
                 dataset_checkpoint.dataset_name,
@@ -280,18 +415,17 @@ class TaskManager(object):
         return False
 
     def get_dataset_epoch(self, dataset_name):
-        if dataset_name in self._datasets:
-            return self._datasets[dataset_name].get_epoch()
+        dataset = self._datasets.get(dataset_name, None)
+        if dataset:
+            return dataset.get_epoch()
         else:
             logger.error("There is not exit dataset {}".format(dataset_name))
             return 0
 
     def training_started(self):
         """The training has started if there is a completed batch"""
-        for _, dataset in self._datasets.items():
-            if dataset.get_completed_step() > 0:
-                return True
-        return False
+        datasets = list(self._datasets.values())
+        return any(ds.get_completed_step() > 0 for ds in datasets)
 
     def get_paral_eval_count(self):
         return self._paral_eval_count
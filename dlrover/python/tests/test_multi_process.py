@@ -14,6 +14,7 @@
 import os
 import time
 import unittest
+import uuid
 from unittest import mock
 
 from dlrover.python.common.multi_process import (
@@ -24,11 +25,16 @@ from dlrover.python.common.multi_process import (
     SharedMemory,
     SharedQueue,
     SocketResponse,
-    clear_sock_dir,
     retry_socket,
 )
 
 
+def _unique_name(prefix="test"):
+    """Use a unique name to isolate the shared objects of tests
+    running in parallel."""
+    return f"{prefix}-{uuid.uuid4().hex[:8]}"
+
+
 class SocketTest(object):
     @retry_socket
     def test_retry(self, retry):
@@ -36,8 +42,14 @@ class SocketTest(object):
 
 
 class SharedObjectTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._shared_objs = []
+
     def tearDown(self) -> None:
-        clear_sock_dir()
+        # Only remove the sockets of the test instead of the whole socket
+        # directory which other tests may be using.
+        for obj in self._shared_objs:
+            obj.unlink()
 
     def test_retry(self):
         t = SocketTest()
@@ -45,11 +57,12 @@ class SharedObjectTest(unittest.TestCase):
             t.test_retry(retry=1)
 
     def test_shared_lock(self):
-        name = "test"
+        name = _unique_name()
         os.environ["TORCHELASTIC_RUN_ID"] = "test_job"
         server_lock = SharedLock(name, create=True)
+        self._shared_objs.append(server_lock)
         self.assertTrue(
-            os.path.exists(f"{SOCKET_TMP_DIR}/test_job/sharedlock_test.sock")
+            os.path.exists(f"{SOCKET_TMP_DIR}/test_job/sharedlock_{name}.sock")
         )
         client_lock = SharedLock(name, create=False)
         acquired = server_lock.acquire()
@@ -64,8 +77,9 @@ class SharedObjectTest(unittest.TestCase):
         client_lock.release()
 
     def test_shared_queue(self):
-        name = "test"
+        name = _unique_name()
         server_queue = SharedQueue(name, create=True)
+        self._shared_objs.append(server_queue)
         client_queue = SharedQueue(name, create=False)
         server_queue.put(2)
         qsize = server_queue.qsize()
@@ -83,8 +97,9 @@ class SharedObjectTest(unittest.TestCase):
         self.assertTrue(client_queue.is_available())
 
     def test_shared_dict(self):
-        name = "test"
+        name = _unique_name()
         server_dict = SharedDict(name=name, create=True)
+        self._shared_objs.append(server_dict)
         client_dict = SharedDict(name=name, create=False)
         new_dict = {"a": 1, "b": 2}
         client_dict.set(new_dict)
@@ -103,7 +118,7 @@ class SharedObjectTest(unittest.TestCase):
 
 class SharedMemoryTest(unittest.TestCase):
     def test_unlink(self):
-        fanme = "test-shm"
+        fanme = _unique_name("test-shm")
         with self.assertRaises(ValueError):
             shm = SharedMemory(name=fanme, create=True, size=-1)
         with self.assertRaises(ValueError):
@@ -12,12 +12,19 @@
 # limitations under the License.
 
 import json
+import threading
+import time
 import unittest
+from unittest import mock
 
 from dlrover.proto import elastic_training_pb2
 from dlrover.python.common.constants import NodeType
 from dlrover.python.common.grpc import TaskResult
-from dlrover.python.master.shard.task_manager import DatasetShardCheckpoint
+from dlrover.python.master.monitor.speed_monitor import SpeedMonitor
+from dlrover.python.master.shard.task_manager import (
+    DatasetShardCheckpoint,
+    TaskManager,
+)
 from dlrover.python.tests.test_utils import (
     create_task_manager,
     create_test_dataset_splitter,
@@ -43,6 +50,7 @@ class TaskMangerTest(unittest.TestCase):
         task = task_manager.get_dataset_task(NodeType.WORKER, 1, dataset_name)
         epoch = task_manager.get_dataset_epoch(dataset_name)
         self.assertEqual(epoch, 1)
+        self.assertEqual(dataset_manager.current_epoch, 1)
 
     def test_recover_task(self):
         task_manager = create_task_manager()
@@ -55,6 +63,29 @@ class TaskMangerTest(unittest.TestCase):
         self.assertEqual(len(dataset.todo), 10)
         self.assertEqual(len(dataset.doing), 0)
 
+    def test_recover_worker_tasks(self):
+        task_manager = create_task_manager()
+        dataset_name = "test"
+        dataset = task_manager.get_dataset(dataset_name)
+        task_manager.get_dataset_task(NodeType.WORKER, 0, dataset_name)
+        task_manager.get_dataset_task(NodeType.WORKER, 1, dataset_name)
+        task_manager.get_dataset_task(NodeType.WORKER, 0, dataset_name)
+        self.assertSetEqual(
+            task_manager._worker_tasks[(NodeType.WORKER, 0)],
+            {(dataset_name, 0), (dataset_name, 2)},
+        )
+        request = TaskResult(dataset_name=dataset_name, task_id=2)
+        task_manager.report_dataset_task(request, True)
+        self.assertSetEqual(
+            task_manager._worker_tasks[(NodeType.WORKER, 0)],
+            {(dataset_name, 0)},
+        )
+
+        task_manager.recover_tasks(NodeType.WORKER, 0)
+        self.assertNotIn((NodeType.WORKER, 0), task_manager._worker_tasks)
+        self.assertListEqual(list(dataset.doing.keys()), [1])
+        self.assertEqual(dataset.todo[-1].task_id, 0)
+
     def test_dataset_checkpoint(self):
         task_manager = create_task_manager()
         dataset_name = "test"
@@ -96,6 +127,9 @@ class TaskMangerTest(unittest.TestCase):
         task_manager.restore_dataset_from_checkpoint(checkpoint_str)
         self.assertEqual(dataset.todo[1].shard.start, 100)
         self.assertEqual(len(dataset.todo), 10)
+        self.assertSetEqual(
+            task_manager._worker_tasks[(NodeType.WORKER, 0)], set()
+        )
 
     def test_task_hang(self):
         task_manager = create_task_manager()
@@ -105,6 +139,65 @@ class TaskMangerTest(unittest.TestCase):
         hang = task_manager.task_hanged()
         self.assertTrue(hang)
 
+    def test_reassign_timeout_task(self):
+        task_manager = TaskManager(600, SpeedMonitor())
+        eval_ds = "test-eval"
+        splitter = create_test_dataset_splitter(eval_ds)
+        task_manager.new_dataset(
+            batch_size=10,
+            dataset_size=1000,
+            dataset_name=eval_ds,
+            dataset_splitter=splitter,
+            task_type=elastic_training_pb2.EVALUATION,
+        )
+        timeout_workers = []
+        task_manager.set_task_timeout_callback(timeout_workers.append)
+        task = task_manager.get_dataset_task(NodeType.WORKER, 0, eval_ds)
+        self.assertEqual(len(task_manager._task_deadlines), 1)
+
+        # Mock the deadline of the task comes.
+        task_manager._task_deadlines[0] = (0, 0, eval_ds, task.task_id)
+        timeout_tasks = task_manager._wait_timeout_tasks()
+        self.assertListEqual(timeout_tasks, [(0, eval_ds, task.task_id)])
+        self.assertEqual(len(task_manager._task_deadlines), 0)
+
+        # The worker has reported a task recently and the deadline is reset.
+        task_manager._reassign_timeout_task(*timeout_tasks[0])
+        self.assertEqual(len(task_manager._task_deadlines), 1)
+        self.assertListEqual(timeout_workers, [])
+
+        task_manager._worker_start_task_time[0] = (
+            time.monotonic() - task_manager._task_timeout - 1
+        )
+        task_manager._reassign_timeout_task(*timeout_tasks[0])
+        dataset = task_manager.get_dataset(eval_ds)
+        self.assertEqual(len(dataset.doing), 0)
+        self.assertListEqual(timeout_workers, [0])
+
+    def test_stop_timeout_monitor(self):
+        task_manager = TaskManager(600, SpeedMonitor())
+        task_manager.start()
+        self.assertTrue(task_manager._timeout_monitor_thread.is_alive())
+        task_manager.stop()
+        self.assertIsNone(task_manager._timeout_monitor_thread)
+        self.assertListEqual(task_manager._wait_timeout_tasks(), [])
+
+        # The stop does not wait forever for a blocked callback.
+        task_manager = TaskManager(600, SpeedMonitor())
+        blocked = threading.Event()
+        task_manager._timeout_monitor_thread = threading.Thread(
+            target=blocked.wait, daemon=True
+        )
+        task_manager._timeout_monitor_thread.start()
+        with mock.patch(
+            "dlrover.python.master.shard.task_manager."
+            "_STOP_MONITOR_TIMEOUT_SECS",
+            0.1,
+        ):
+            task_manager.stop()
+        self.assertIsNone(task_manager._timeout_monitor_thread)
+        blocked.set()
+
     def test_paral_eval_count(self):
         task_manager = create_task_manager()
         eval_ds = "test-eval"
@@ -19,6 +19,7 @@ import time
 import unittest
 from pathlib import Path
 from typing import List
+from unittest import mock
 
 import torch
 import torch.distributed as dist
@@ -59,7 +60,12 @@ from dlrover.python.elastic_agent.torch.ckpt_saver import (
     SharedMemoryHandler,
 )
 from dlrover.python.tests.test_utils import start_local_master
-from dlrover.trainer.torch.flash_checkpoint.fsdp import FsdpShardCheckpointer
+from dlrover.trainer.torch.flash_checkpoint.checkpointer import StorageType
+from dlrover.trainer.torch.flash_checkpoint.fsdp import (
+    FsdpFullCheckpointer,
+    FsdpShardCheckpointer,
+    _to_storage_types,
+)
 from dlrover.trainer.torch.flash_checkpoint.fsdp_engine import (
     FileReader,
     FsdpCheckpointEngine,
@@ -71,6 +77,7 @@ from dlrover.trainer.torch.flash_checkpoint.fsdp_engine import (
     _write_memory_from_list,
 )
 
+_FSDP_MODULE = "dlrover.trainer.torch.flash_checkpoint.fsdp"
 _OPTIMIZER_KEY = "optimizer.params.group"
 _MODEL_TENSOR_KEY = "model.weights"
 
@@ -419,3 +426,138 @@ class FsdpCheckpointTest(unittest.TestCase):
                 self.assertListEqual(files, [".metadata", "__0_0.distcp"])
                 reader = checkpointer._engine.load(path)
                 self.assertTrue(isinstance(reader, SharedMemoryReader))
+
+
+class FsdpCheckpointerSaveTest(unittest.TestCase):
+    """Test saving checkpoints with mocked engines and FSDP APIs."""
+
+    def setUp(self):
+        self._patchers = [
+            mock.patch(f"{_FSDP_MODULE}.FsdpCheckpointEngine"),
+            mock.patch(f"{_FSDP_MODULE}.FullCheckpointEngine"),
+            mock.patch(f"{_FSDP_MODULE}.FSDP"),
+        ]
+        for patcher in self._patchers:
+            patcher.start()
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.checkpoint_dir = self._tmpdir.name
+        self.model = mock.MagicMock()
+        self.optimizer = mock.MagicMock()
+
+    def tearDown(self):
+        for patcher in self._patchers:
+            patcher.stop()
+        self._tmpdir.cleanup()
+
+    def test_to_storage_types(self):
+        self.assertListEqual(
+            _to_storage_types(StorageType.DISK), [StorageType.DISK]
+        )
+        self.assertListEqual(
+            _to_storage_types(
+                [StorageType.MEMORY, StorageType.DISK, StorageType.MEMORY]
+            ),
+            [StorageType.MEMORY, StorageType.DISK],
+        )
+        self.assertListEqual(
+            _to_storage_types((StorageType.MEMORY,)), [StorageType.MEMORY]
+        )
+        with self.assertRaises(ValueError):
+            _to_storage_types([])
+        with self.assertRaises(ValueError):
+            _to_storage_types(None)
+        with self.assertRaises(ValueError):
+            _to_storage_types([StorageType.MEMORY, "disk"])
+
+    def _check_save_dispatch(self, checkpointer):
+        engine = checkpointer._engine
+        checkpointer.save_checkpoint(
+            1, self.model, self.optimizer, storage_type=[StorageType.MEMORY]
+        )
+        engine.save_to_memory.assert_called_once()
+        engine.save_to_storage.assert_not_called()
+
+        engine.reset_mock()
+        checkpointer.save_checkpoint(
+            2,
+            self.model,
+            self.optimizer,
+            storage_type=[StorageType.MEMORY, StorageType.DISK],
+        )
+        engine.save_to_storage.assert_called_once()
+        engine.save_to_memory.assert_not_called()
+
+    def test_shard_checkpointer_save_dispatch(self):
+        checkpointer = FsdpShardCheckpointer(self.checkpoint_dir)
+        self._check_save_dispatch(checkpointer)
+
+    def test_full_checkpointer_save_dispatch(self):
+        checkpointer = FsdpFullCheckpointer(self.checkpoint_dir)
+        self._check_save_dispatch(checkpointer)
+
+    def test_full_checkpointer_rank0_only(self):
+        checkpointer = FsdpFullCheckpointer(self.checkpoint_dir)
+        checkpointer._rank = 1
+        engine = checkpointer._engine
+        checkpointer.save_checkpoint(
+            1, self.model, self.optimizer, rank0_only=True
+        )
+        engine.save_to_storage.assert_called_once()
+        state_dict = engine.save_to_storage.call_args[0][1]
+        self.assertDictEqual(state_dict, {})
+
+        engine.reset_mock()
+        checkpointer.save_checkpoint(
+            2, self.model, self.optimizer, rank0_only=False
+        )
+        state_dict = engine.save_to_storage.call_args[0][1]
+        self.assertIn(CheckpointConstant.MODEL_STATES_NAME, state_dict)
+
+    def test_full_checkpointer_default_rank0_only(self):
+        for world_size, rank0_only in [("1", True), ("2", False)]:
+            with mock.patch.dict(os.environ, {"GROUP_WORLD_SIZE": world_size}):
+                checkpointer = FsdpFullCheckpointer(self.checkpoint_dir)
+            self.assertEqual(checkpointer._only_rank0_saves, rank0_only)
+            checkpointer._rank = 1
+            engine = checkpointer._engine
+            engine.reset_mock()
+            checkpointer.save_checkpoint(1, self.model, self.optimizer)
+            engine.save_to_storage.assert_called_once()
+            state_dict = engine.save_to_storage.call_args[0][1]
+            self.assertEqual(state_dict == {}, rank0_only)
+
+    def test_full_checkpointer_rmtree_before_saving(self):
+        checkpointer = FsdpFullCheckpointer(self.checkpoint_dir)
+        engine = checkpointer._engine
+        engine.reset_mock()
+        events = []
+
+        def _safe_rmtree(path):
+            time.sleep(0.1)
+            events.append("rmtree")
+
+        def _save_to_storage(step, state_dict, paths):
+            events.append("save")
+
+        checkpointer.storage.safe_rmtree = mock.MagicMock(
+            side_effect=_safe_rmtree
+        )
+        engine.save_to_storage.side_effect = _save_to_storage
+        checkpointer.save_checkpoint(1, self.model, self.optimizer)
+        self.assertListEqual(events, ["rmtree", "save"])
+        checkpointer.storage.safe_rmtree.assert_called_once_with(
+            os.path.join(self.checkpoint_dir, "1")
+        )
+        self.assertIsNone(checkpointer._pending_rmtree)
+
+        checkpointer.storage.safe_rmtree.reset_mock()
+        checkpointer.save_checkpoint(
+            2, self.model, self.optimizer, storage_type=StorageType.MEMORY
+        )
+        checkpointer.storage.safe_rmtree.assert_not_called()
+        self.assertIsNone(checkpointer._pending_rmtree)
+        engine.save_to_memory.assert_called_once()
+
+        checkpointer.close()
+        with self.assertRaises(RuntimeError):
+            checkpointer._io_executor.submit(print)
@@ -12,6 +12,8 @@
 # limitations under the License.
 
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Union
 
 import torch.distributed as dist
 import torch.distributed.checkpoint as dist_cp
@@ -23,6 +25,7 @@ from torch.distributed.fsdp import FullyShardedDataParallel as FSDP
 from torch.distributed.fsdp import StateDictType
 from torch.distributed.fsdp.api import FullOptimStateDictConfig
 
+from dlrover.python.common import env_utils
 from dlrover.python.common.constants import CheckpointConstant
 from dlrover.python.common.storage import get_checkpoint_storage
 from dlrover.trainer.torch.flash_checkpoint.full_ckpt_engine import (
@@ -33,6 +36,23 @@ from .checkpointer import Checkpointer, StorageType
 from .fsdp_engine import FsdpCheckpointEngine
 
 
+def _to_storage_types(
+    storage_type: Union[StorageType, List[StorageType]]
+) -> List[StorageType]:
+    """Return the deduplicated list of storage types to save into."""
+    if isinstance(storage_type, StorageType):
+        storage_type = [storage_type]
+    if not isinstance(storage_type, (list, tuple)) or not storage_type:
+        raise ValueError(f"No support storage type {storage_type}")
+    storage_types: List[StorageType] = []
+    for t in storage_type:
+        if t not in (StorageType.MEMORY, StorageType.DISK):
+            raise ValueError(f"No support storage type {t}")
+        if t not in storage_types:
+            storage_types.append(t)
+    return storage_types
+
+
 class FsdpShardCheckpointer(Checkpointer):
     """
     Flash checkpointer saves and loads a FSDP module.
@@ -55,6 +75,13 @@ class FsdpShardCheckpointer(Checkpointer):
         >>>     checkpointer.save_checkpoint(
         >>>         step, state_dict, ckpt_dir
         >>>     )
+        >>> # Save the checkpoint into the memory and storage at once.
+        >>> checkpointer.save_checkpoint(
+        >>>     step,
+        >>>     state_dict,
+        >>>     ckpt_dir,
+        >>>     storage_type=[StorageType.MEMORY, StorageType.DISK],
+        >>> )
         >>> # Load checkpoint
         >>> checkpointer.load_checkpoint(model, optimzier)
     """
@@ -93,8 +120,10 @@ class FsdpShardCheckpointer(Checkpointer):
             path(str): A path to store the checkpoint.
             storage_type: Save the checkpoint into the memory
                 if `StorageType.MEMORY` and into the dist
-                if `StorageType.DISK`.
+                if `StorageType.DISK`. It can be a list of storage
+                types to save the checkpoint collected once into both.
         """
+        storage_types = _to_storage_types(storage_type)
         with FSDP.state_dict_type(model, StateDictType.SHARDED_STATE_DICT):
             state_dict = {
                 "model": model.state_dict(),
@@ -104,16 +133,16 @@ class FsdpShardCheckpointer(Checkpointer):
             if not path:
                 path = os.path.join(self.checkpoint_dir, str(step))
             paths = {CheckpointConstant.MODEL_STATES_NAME: path}
-            if storage_type == StorageType.MEMORY:
-                self._engine.save_to_memory(step, state_dict, paths)
-            elif storage_type == StorageType.DISK:
+            if StorageType.DISK in storage_types:
                 if not path:
                     raise ValueError(
                         "path cannot be empty if storage type is disk!"
                     )
+                # The engine also saves the state dict into the memory
+                # before saving it into the storage.
                 self._engine.save_to_storage(step, state_dict, paths)
             else:
-                raise ValueError(f"No support storage type {storage_type}")
+                self._engine.save_to_memory(step, state_dict, paths)
 
     def load_checkpoint(self, model, optimizer, resume_path=""):
         with FSDP.state_dict_type(model, StateDictType.SHARDED_STATE_DICT):
@@ -183,6 +212,16 @@ class FsdpFullCheckpointer(Checkpointer):
         >>>         checkpointer.save_checkpoint(
         >>>             step, model, optimizer, extra_sd, path
         >>>         )
+        >>>     # Gather the full state dict once for both memory and disk.
+        >>>     if step % 1000 == 0:
+        >>>         checkpointer.save_checkpoint(
+        >>>             step,
+        >>>             model,
+        >>>             optimizer,
+        >>>             extra_sd,
+        >>>             path,
+        >>>             storage_type=[StorageType.MEMORY, StorageType.DISK],
+        >>>         )
         >>> sate_dict = checkpointer.load_checkpoint(model, optimizer)
     """
 
@@ -207,6 +246,16 @@ class FsdpFullCheckpointer(Checkpointer):
             comm_backend=comm_backend,
             save_timeout=save_timeout,
         )
+        # Only rank 0 saves the checkpoint into the memory and storage
+        # if there is only one node because only the local rank 0 of
+        # each node saves the full state dict.
+        self._only_rank0_saves = env_utils.get_group_world_size() == 1
+        # The thread to remove the stale checkpoint directory in the
+        # background while gathering the full state dict.
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="ckpt_rmtree"
+        )
+        self._pending_rmtree: Optional[Future] = None
 
     def save_checkpoint(
         self,
@@ -216,6 +265,7 @@ class FsdpFullCheckpointer(Checkpointer):
         extra_sd={},
         path="",
         storage_type=StorageType.DISK,
+        rank0_only: Optional[bool] = None,
     ):
         """
         Save a fsdp model and optimizer.
@@ -229,37 +279,65 @@ class FsdpFullCheckpointer(Checkpointer):
             path(str): A path to store the checkpoint.
             storage_type: Save the checkpoint into the memory
                 if `StorageType.MEMORY` and into the dist
-                if `StorageType.DISK`.
+                if `StorageType.DISK`. It can be a list of storage
+                types to save the full state dict gathered once into both.
+            rank0_only(bool): Only gather the full state dict on rank 0 and
+                other ranks skip saving the checkpoint into the memory.
+                If None, it is True only if rank 0 is the only rank to save
+                the checkpoint, i.e. the job has only one node. Note that
+                the memory of other nodes will not hold the checkpoint
+                of the step if it is True.
         """
+        storage_types = _to_storage_types(storage_type)
+        save_to_disk = StorageType.DISK in storage_types
+        if rank0_only is None:
+            rank0_only = self._only_rank0_saves
         if path == "":
             ckpt_name = f"{step}/rank_{self._rank}.pt"
             path = os.path.join(self.checkpoint_dir, ckpt_name)
 
+        if save_to_disk and self._rank == 0:
+            self._wait_pending_rmtree()
+            self._pending_rmtree = self._io_executor.submit(
+                self.storage.safe_rmtree, os.path.dirname(path)
+            )
+
         with FSDP.state_dict_type(
             model,
             StateDictType.FULL_STATE_DICT,
-            FullStateDictConfig(rank0_only=False),
-            FullOptimStateDictConfig(rank0_only=False),
+            # Gather the full state dict into the CPU memory to avoid
+            # holding the unsharded states in the GPU memory. The engine
+            # copies CPU tensors into the shared memory by memcpy.
+            FullStateDictConfig(offload_to_cpu=True, rank0_only=rank0_only),
+            FullOptimStateDictConfig(
+                offload_to_cpu=True, rank0_only=rank0_only
+            ),
         ):
             msd = model.state_dict()
             osd = FSDP.optim_state_dict(model, optimizer)
-        state_dict = {"model": msd, "optimizer": osd}
-        state_dict.update(extra_sd)
 
-        state_dict = {CheckpointConstant.MODEL_STATES_NAME: state_dict}
+        if rank0_only and self._rank != 0:
+            # The state dict is empty and the engine skips saving it
+            # but the rank still joins the synchronization of saving.
+            state_dict = {}
+        else:
+            state_dict = {"model": msd, "optimizer": osd}
+            state_dict.update(extra_sd)
+            state_dict = {CheckpointConstant.MODEL_STATES_NAME: state_dict}
         paths = {CheckpointConstant.MODEL_STATES_NAME: path}
-        if storage_type == StorageType.MEMORY:
-            self._engine.save_to_memory(step, state_dict, paths)
-        elif storage_type == StorageType.DISK:
+        if save_to_disk:
             if not path:
                 raise ValueError(
                     "path cannot be empty if storage type is disk!"
                 )
-            if self._rank == 0:
-                self.storage.safe_rmtree(os.path.dirname(path))
+            # The directory must be removed before the saver writes the
+            # new checkpoint into it.
+            self._wait_pending_rmtree()
+            # The engine also saves the state dict into the memory
+            # before saving it into the storage.
             self._engine.save_to_storage(step, state_dict, paths)
         else:
-            raise ValueError(f"No support storage type {storage_type}")
+            self._engine.save_to_memory(step, state_dict, paths)
 
     def load_checkpoint(self, model, optimizer, resume_path=""):
         """
@@ -291,6 +369,18 @@ class FsdpFullCheckpointer(Checkpointer):
         optimizer.load_state_dict(optim_state_dict)
         return state_dict
 
+    def _wait_pending_rmtree(self):
+        if self._pending_rmtree is not None:
+            self._pending_rmtree.result()
+            self._pending_rmtree = None
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Shut down the thread to remove the stale checkpoint directory."""
+        self._io_executor.shutdown(wait=True)
+
     def wait_latest_checkpoint(self, timeout=1800):
         """
         Wait for the latest checkpoint.
@@ -446,23 +446,21 @@ def save_checkpoint(model_params, ckpt_params):
         # Warning: When n_procs_per_node is not greater than 1,
         # the checkpoint saving would be stuck.
         extra_sd = {"step": steps}
+        storage_types = []
         if steps % ckpt_params["save_memory_interval"] == 0:
-            checkpointer.save_checkpoint(
-                steps,
-                model,
-                optimizer,
-                extra_sd,
-                storage_type=StorageType.MEMORY,
-            )
-            saved = True
-
+            storage_types.append(StorageType.MEMORY)
         if steps % ckpt_params["save_storage_interval"] == 0:
+            storage_types.append(StorageType.DISK)
+
+        # Collect the state dict only once if the checkpoint is saved
+        # into both the memory and the disk at the step.
+        if storage_types:
             checkpointer.save_checkpoint(
                 steps,
                 model,
                 optimizer,
                 extra_sd,
-                storage_type=StorageType.DISK,
+                storage_type=storage_types,
             )
             saved = True
 